@@ -1,15 +1,315 @@
-import json
+import asyncio
+import orjson
 import requests
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from string import Template
 import os
 import logging
 import re
-from typing import Dict, List, Any, Optional
-from tools import Tools
+from typing import AsyncIterator, Dict, List, Any, NamedTuple, Optional
+import httpx
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from tools import Tools, _LazyJson
 
 # Set up logging
 logging.basicConfig(level=logging.INFO, format='%(message)s')
 logger = logging.getLogger("ReActAgent")
 
+
+def _format_specialties(specialties: List[Dict[str, Any]], limit: int = 5) -> str:
+    """
+    Format a list of specialty records into a single response string.
+
+    Built with one str.join instead of repeated concatenation so the cost
+    is linear in the number of names shown.
+
+    Args:
+        specialties: Specialty records from the API
+        limit: Maximum number of names to include
+
+    Returns:
+        Formatted response string
+    """
+    if not specialties:
+        return "I couldn't find any matching specialties for your query."
+
+    total = len(specialties)
+    names = ", ".join(s.get("DESCRIPTION", "Unknown") for s in islice(specialties, limit))
+    answer = f"I found these specialties: {names}"
+    if total > limit:
+        answer += f" and {total - limit} more."
+    return answer
+
+def _extract_json_object(content: str) -> str:
+    """
+    Slice the first brace-balanced JSON object out of a string.
+
+    A single forward pass tracking brace depth (and skipping braces inside
+    string literals) replaces the old greedy r'{.*}' DOTALL regex, which
+    backtracked across the whole LLM output.
+
+    Args:
+        content: Raw LLM output that may wrap JSON in extra text
+
+    Returns:
+        The balanced object slice, or the input unchanged if none is found
+    """
+    start = content.find("{")
+    if start == -1:
+        return content
+
+    depth = 0
+    in_string = False
+    escaped = False
+    for i in range(start, len(content)):
+        ch = content[i]
+        if in_string:
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+        elif ch == "{":
+            depth += 1
+        elif ch == "}":
+            depth -= 1
+            if depth == 0:
+                return content[start:i + 1]
+
+    return content
+
+class ActionResult(NamedTuple):
+    """
+    Result of executing one tool action.
+
+    A NamedTuple instead of an ad-hoc dict: the hot act/observe path
+    allocates one of these per tool call, and slot access is cheaper than
+    dict hashing while fixing the shape the consumers rely on.
+    """
+    success: bool
+    result: Any = None
+    error: Optional[str] = None
+    needs_parameters: bool = False
+    parameter_prompt: Optional[str] = None
+    tool_name: Optional[str] = None
+    parameter_requirements: Optional[Dict[str, Any]] = None
+
+def _log_prefetch_failure(future) -> None:
+    """
+    Done-callback for speculative prefetches: swallow the exception so it
+    is never re-raised at garbage collection, and record it at DEBUG.
+    """
+    exc = future.exception()
+    if exc is not None:
+        logger.debug(f"Specialty prefetch failed: {exc}")
+
+# Detector patterns compiled once at import. Each replaces a Python-level
+# loop of substring checks or re.search calls with a single scan of the
+# query; alternations keep the original substring semantics (no word
+# boundaries), so matching behaviour is unchanged.
+_APPOINTMENT_TERM_RE = re.compile(r"book|schedule|appointment|slot|visit|time")
+
+_FULL_LIST_RE = re.compile(
+    r"(yes|yeah|sure|ok|okay|full|complete|all).+(list|specialties|speciality|specialists)"
+    r"|(show|see|give).+(all|full|complete|more).+(list|specialties)"
+    r"|(list|show).+(all|everything|every|more)"
+    r"|what.+(all|else|other).+(available|have)"
+)
+
+_SPECIALTY_QUESTION_RE = re.compile(
+    r"(do|does|are|can|have).+(doctor|specialist|physician)"
+    r"|(what|which).+(specialist|specialty|department)"
+    r"|looking for.+(doctor|specialist)"
+    r"|(find|need).+(doctor|specialist)"
+    r"|(tell|inform).+(about|your).+(specialist|specialty|department)"
+    r"|(what|which|any|is).+(doctor|specialist|department).+(available|have|for|treat)"
+)
+
+_QUESTION_WORD_RE = re.compile(
+    r"what|which|where|how|when|do|does|are|can|have|tell|inform"
+)
+
+_GREETING_RE = re.compile(
+    r"^(hi|hello|hey|greetings|good morning|good afternoon|good evening)[\s\W]*$"
+    r"|^how are you(\?)?$"
+    r"|^what'?s up(\?)?$"
+    r"|(nice to meet you|pleased to meet you)(\.)$"
+)
+
+_STRONG_APPOINTMENT_RE = re.compile(
+    "|".join(re.escape(p) for p in (
+        "book appointment", "schedule appointment", "make appointment",
+        "get appointment", "create appointment", "new appointment",
+        "appointment booking", "appointment schedule", "appointment availability",
+        "book a visit", "schedule a visit", "book a slot"
+    ))
+)
+
+_APPOINTMENT_PATTERN_RE = re.compile(
+    r"(book|schedule|make|get|create).+(appointment|visit|consultation)"
+    r"|(available|free|open).+(slot|time|appointment)"
+    r"|(when|how).+(see|meet|visit).+(doctor|specialist)"
+    r"|(my|check).+(appointment|booking|reservation)"
+    r"|walk.?in"
+    r"|follow.?up"
+    r"|(today|tomorrow).+(appointment|visit)"
+    r"|(appointment|booking).+(system|process|available)"
+)
+
+_APPOINTMENT_NOUN_RE = re.compile(r"appointment|booking|schedule|slot")
+_APPOINTMENT_CONTEXT_RE = re.compile(r"doctor|hospital|clinic|medical|visit")
+
+# System prompts hoisted to module constants: one shared object per
+# process instead of re-binding a multi-kilobyte literal on every call.
+# Treat as immutable - prompt constructors must only read them.
+_REASONING_SYSTEM_MSG = {"role": "system", "content": """
+        You are an intelligent hospital assistant that helps users with their queries about doctor specialties and appointments only.
+        
+        Your task is to analyze the user's query and decide whether to use a tool or answer directly.
+        
+        Currently, you have access to the following tools:
+        
+        SPECIALTY TOOLS:
+        1. get_doctor_specialties: Retrieves information about doctor specialties
+        
+        APPOINTMENT TOOLS:
+        2. activate_sso: Activates Single Sign-On for a user
+        3. search_by_id_number: Searches for a patient by ID number
+        4. get_today_appointments: Retrieves today's appointments
+        5. get_ongoing_visits: Retrieves ongoing patient visits
+        6. init_appointments: Initializes the appointments system
+        7. get_user_dataset: Retrieves user dataset for appointments
+        8. get_session_slots: Retrieves appointment session slots
+        9. create_walkin: Creates a walk-in appointment
+        10. get_appointment_number: Retrieves appointment numbers
+        11. create_visit: Creates a patient visit
+        12. get_patient_journey: Retrieves patient journey information
+        13. get_appointment_followup: Retrieves follow-up appointment information
+        
+        IMPORTANT: You should ONLY answer questions about doctor specialties and appointments in the hospital. For ANY other topic:
+        1. You must set "out_of_scope" to true
+        2. You should NOT provide an answer, as you don't have verified information on other topics
+        3. Your response should direct the user back to asking about doctor specialties or appointments
+        
+        EXAMPLES OF SPECIALTY QUERIES:
+        - "What specialties do you have?"
+        - "Do you have cardiologists?"
+        - "Tell me about your orthopedic department"
+        
+        EXAMPLES OF APPOINTMENT QUERIES:
+        - "I want to book an appointment"
+        - "Show me today's appointments"
+        - "What appointment slots are available?"
+        - "How do I schedule a follow-up?"
+        
+        EXAMPLES OF OUT-OF-SCOPE QUERIES:
+        - "What medications should I take for headaches?"
+        - "How much does surgery cost?"
+        - "What's the weather today?"
+        
+        For each query, you should:
+        1. Think about what the user is asking for
+        2. Decide if it's about doctor specialties or appointments (if not, mark it out of scope)
+        3. Format your response as JSON with the following structure:
+        
+        If you need to use a tool:
+        {
+            "reasoning": "your step-by-step reasoning",
+            "use_tool": true,
+            "action": {
+                "action_type": "[one of the tool names]",
+                "parameters": {"param1": "value1", "param2": "value2"}
+            },
+            "response_template": "optional: a short answer sentence containing the literal placeholder {observation} where the tool's result should be inserted, if a simple fill-in answer will suffice"
+        }
+
+        If you need several independent tools at once, replace "action" with
+        "actions": [a list of action objects in the same format].
+
+        If you can answer directly (ONLY for basic specialty/appointment information or greetings):
+        {
+            "reasoning": "your step-by-step reasoning",
+            "use_tool": false,
+            "direct_answer": "your answer to the user's query about doctor specialties or appointments"
+        }
+        
+        If the query is NOT about doctor specialties or appointments:
+        {
+            "reasoning": "your step-by-step reasoning",
+            "use_tool": false,
+            "out_of_scope": true,
+            "direct_answer": null
+        }
+        """}
+
+_FINAL_SYSTEM_MSG = {"role": "system", "content": """
+        You are an intelligent hospital assistant that helps users with their queries about doctor specialties and appointments.
+        
+        Based on the user's query, the reasoning, and the observation from using a tool,
+        formulate a helpful, concise, and informative response.
+        
+        IMPORTANT RULES:
+        1. Only respond with information that is directly supported by the observation
+        2. If the observation doesn't provide enough information to answer, say so clearly
+        3. Never make up or hallucinate information about specialists, departments, or appointments
+        4. If relevant information is found, present it in a clear, helpful way
+        5. If no relevant information is found, politely inform the user
+        
+        Provide only the final answer without mentioning the reasoning process or the fact that you used a tool.
+        """}
+
+# Specialty lists at or below this size are answered by the deterministic
+# formatter instead of a final LLM call; larger lists still go to the LLM
+# for summarization. Full-list requests are always formatted directly
+# (restating a catalog needs no model) with a wider display cap.
+_DIRECT_FORMAT_MAX = 10
+_FULL_LIST_LIMIT = 20
+
+# Final-answer prompt precompiled as a string.Template: the shape is fixed,
+# so each call does one substitute() with no f-string re-assembly, and the
+# tool parameters / observation go in compact (non-indented) JSON — the
+# LLM doesn't need pretty-printing
+_FINAL_PROMPT_TMPL = Template("""
+        User query: ${user_query}
+
+        Reasoning: ${reasoning}
+
+        Tool used: ${tool}
+        Tool parameters: ${params}
+
+        Observation: ${observation}
+
+        Based on this information, provide a helpful answer to the user's original query.
+        Remember to ONLY use information from the observation and do not make up or hallucinate any details.
+        """)
+
+# Tools whose endpoints create or change upstream records. Answers from
+# turns that attempted any of these must never be served from a response
+# cache: replaying a cached confirmation would skip the actual booking.
+MUTATING_TOOLS = frozenset({"create_walkin", "create_visit", "activate_sso"})
+
+# Canned answers used when the final LLM call fails after a successful
+# tool run, keyed by action_type. A dict lookup replaces the old if/elif
+# chain of substring tests; the specialty-formatting case stays special
+# because it renders the actual tool result.
+_FALLBACK_MESSAGES = {
+    "create_walkin": "I've scheduled a walk-in appointment for you. Your appointment has been confirmed.",
+    "get_today_appointments": "I've retrieved today's appointments. You can view the details in the system.",
+    "get_ongoing_visits": "I've checked the ongoing visits in the hospital. The information has been retrieved.",
+    "get_session_slots": "I've found available appointment slots. You can select one for your appointment.",
+    "get_appointment_followup": "I've checked your follow-up appointments. The information is now available.",
+    "get_patient_journey": "I've retrieved your patient journey information. You can see your progress.",
+    "create_visit": "I've created a visit record for your appointment. You're all set.",
+    "search_by_id_number": "I've found your patient record using your ID number. Your information has been retrieved.",
+    "activate_sso": "I've activated your SSO account. You can now log in with your credentials.",
+}
+
 class ReActAgent:
     """
     ReAct Agent for hospital chatbot using the Reason-Act-Observe paradigm.
@@ -33,12 +333,35 @@ class ReActAgent:
         self.specialty_api_endpoint = specialty_api_endpoint
         self.specialty_api_token = specialty_api_token or os.getenv("SPECIALTY_API_TOKEN")
         self.debug_mode = debug_mode
-        
+
+        # Read timeout for LLM generations; generous because a local model
+        # can legitimately take tens of seconds for a long completion
+        self.llm_timeout = float(os.getenv("LLM_TIMEOUT", "120"))
+
+        # Shared HTTP session with keep-alive and a connection pool, so the
+        # LLM and hospital API calls reuse connections instead of paying a
+        # TCP handshake per request. Transient gateway errors are retried
+        # with a short backoff at the transport level.
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=8,
+            pool_maxsize=32,
+            max_retries=Retry(total=2, backoff_factor=0.2, status_forcelist=[429, 502, 503, 504])
+        )
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers.update({"Content-Type": "application/json"})
+
+        # Async client for the streaming path, created lazily on first use
+        # so the sync-only code path never pays for it
+        self._async_client = None
+
         # Initialize tools
         self.tools_manager = Tools(
             specialty_api_endpoint=specialty_api_endpoint,
             specialty_api_token=self.specialty_api_token,
-            debug_mode=debug_mode
+            debug_mode=debug_mode,
+            session=self.session
         )
         
         # Available tools mapping - mapping tool names to methods in Tools class
@@ -58,8 +381,10 @@ class ReActAgent:
             "get_appointment_followup": self.tools_manager.get_appointment_followup
         }
         
-        # Initialize conversation history
-        self.conversation_history = []
+        # Initialize conversation history. A bounded ring buffer: only the
+        # last few exchanges are ever fed to the LLM, so unbounded growth
+        # over a long session would be pure memory leak
+        self.conversation_history = deque(maxlen=40)
         
         # Keywords related to doctor specialties for better detection
         self.specialty_keywords = [
@@ -75,7 +400,23 @@ class ReActAgent:
             "consultation", "meet", "session", "timing", "available", 
             "follow-up", "followup", "checkup", "walkin", "walk-in"
         ]
-        
+
+        # Executor for fanning out independent tool calls when a reasoning
+        # step requests several at once; sized small since tools are I/O
+        self._tool_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="tool")
+
+        # Single alternation over the keyword list so detection is one
+        # regex scan instead of a Python loop of substring checks, plus a
+        # token set for an exact-hit fast path that skips the regex engine
+        self._specialty_keyword_re = re.compile(
+            "|".join(re.escape(k) for k in self.specialty_keywords)
+        )
+        self._specialty_keyword_set = frozenset(self.specialty_keywords)
+
+        # debug_mode drives the logger level; payload dumps log at DEBUG
+        # with lazy args so they cost nothing when filtered out
+        logger.setLevel(logging.DEBUG if debug_mode else logging.INFO)
+
         logger.info("ReAct Agent initialized with debug_mode=%s", debug_mode)
         
     def _reason(self, user_query: str) -> Dict[str, Any]:
@@ -92,21 +433,23 @@ class ReActAgent:
         logger.info("\n=== REASONING ===")
         
         # First check if this is a general greeting or simple question
-        if self._is_greeting(user_query):
+        query_lower = user_query.lower()
+
+        if self._is_greeting(query_lower):
             logger.info("Detected greeting or simple question, providing direct answer")
             
             return {
                 "reasoning": "The user is providing a greeting or asking a simple question. I can answer directly without using a tool.",
                 "use_tool": False,
-                "direct_answer": self._get_greeting_response(user_query)
+                "direct_answer": self._get_greeting_response(query_lower)
             }
         
         # Then check for appointment-related queries (higher priority)
-        if self._is_appointment_query(user_query):
+        if self._is_appointment_query(query_lower):
             logger.info("Detected appointment-related question, selecting appropriate appointment tool")
             
             # Select the appropriate tool based on the query 
-            tool_action = self._select_appointment_tool(user_query)
+            tool_action = self._select_appointment_tool(query_lower)
             
             return {
                 "reasoning": f"The user is asking about appointments. I should use the {tool_action['action_type']} tool.",
@@ -115,7 +458,7 @@ class ReActAgent:
             }
         
         # Then check for specialty-related queries
-        if self._is_specialty_query(user_query):
+        if self._is_specialty_query(query_lower):
             logger.info("Detected specialty-related question, enforcing API call for ReAct flow")
             
             # Extract potential specialty from query
@@ -154,163 +497,100 @@ class ReActAgent:
                 "direct_answer": "I'm here to help with questions about doctor specialties and appointments at our hospital. How can I assist you today?"
             }
     
-    def _is_greeting(self, query: str) -> bool:
+    def _is_greeting(self, query_lower: str) -> bool:
         """
         Determine if a query is a simple greeting or general question.
         
         Args:
-            query: The user query to check
+            query_lower: The user query, pre-lowercased by the caller
             
         Returns:
             Boolean indicating if the query is a greeting
         """
-        query_lower = query.lower()
-        
-        greeting_patterns = [
-            r"^(hi|hello|hey|greetings|good morning|good afternoon|good evening)[\s\W]*$",
-            r"^how are you(\?)?$",
-            r"^what'?s up(\?)?$",
-            r"(nice to meet you|pleased to meet you)(\.)$"
-        ]
-        
-        for pattern in greeting_patterns:
-            if re.search(pattern, query_lower):
-                return True
-                
-        return False
+        return _GREETING_RE.search(query_lower) is not None
     
-    def _get_greeting_response(self, query: str) -> str:
+    def _get_greeting_response(self, query_lower: str) -> str:
         """
         Generate a response for greetings.
         
         Args:
-            query: The user's greeting
+            query_lower: The user's greeting, pre-lowercased by the caller
             
         Returns:
             A greeting response
         """
-        query_lower = query.lower()
-        
         if re.search(r"how are you", query_lower):
             return "I'm doing well, thank you for asking! I'm here to help with questions about doctor specialties and appointments at our hospital. How can I assist you today?"
             
         return "Hello! I'm the SmartClinic assistant. I can help you with information about doctor specialties and appointments at our hospital. How can I assist you today?"
     
-    def _is_specialty_query(self, query: str) -> bool:
+    def _is_specialty_query(self, query_lower: str) -> bool:
         """
         Determine if a query is related to doctor specialties.
         
         Args:
-            query: The user query to check
+            query_lower: The user query, pre-lowercased by the caller
             
         Returns:
             Boolean indicating if the query is about specialties
         """
-        query_lower = query.lower()
-        
         # Avoid false positives by checking for appointment terms first
-        if any(word in query_lower for word in ["book", "schedule", "appointment", "slot", "visit", "time"]):
+        if _APPOINTMENT_TERM_RE.search(query_lower):
             return False
-        
+
         # Check for follow-up queries about listing specialties
-        full_list_patterns = [
-            r"(yes|yeah|sure|ok|okay|full|complete|all).+(list|specialties|speciality|specialists)",
-            r"(show|see|give).+(all|full|complete|more).+(list|specialties)",
-            r"(list|show).+(all|everything|every|more)",
-            r"what.+(all|else|other).+(available|have)"
-        ]
-        
-        for pattern in full_list_patterns:
-            if re.search(pattern, query_lower):
-                return True
-        
-        # Check for specialty keywords but make sure they're not just part of a general question
-        specialty_keyword_match = False
-        for keyword in self.specialty_keywords:
-            if keyword in query_lower:
-                specialty_keyword_match = True
-                break
-                
-        if specialty_keyword_match:
+        if _FULL_LIST_RE.search(query_lower):
+            return True
+
+        # Check for specialty keywords but make sure they're not just part
+        # of a general question. Whole-token hits ('doctor', 'cardio')
+        # short-circuit via set membership; the regex still catches
+        # substring forms like 'cardiologist'
+        if (not self._specialty_keyword_set.isdisjoint(query_lower.split())
+                or self._specialty_keyword_re.search(query_lower)):
             # Check if it's a question about specialties, not just containing the word
-            specialty_patterns = [
-                r"(do|does|are|can|have).+(doctor|specialist|physician)",
-                r"(what|which).+(specialist|specialty|department)",
-                r"looking for.+(doctor|specialist)",
-                r"(find|need).+(doctor|specialist)",
-                r"(tell|inform).+(about|your).+(specialist|specialty|department)",
-                r"(what|which|any|is).+(doctor|specialist|department).+(available|have|for|treat)"
-            ]
-            
-            for pattern in specialty_patterns:
-                if re.search(pattern, query_lower):
-                    return True
-                    
+            if _SPECIALTY_QUESTION_RE.search(query_lower):
+                return True
+
             # If it's not an explicit question about specialties, be more conservative
-            if not any(word in query_lower for word in ["what", "which", "where", "how", "when", "do", "does", "are", "can", "have", "tell", "inform"]):
-                return False
-                
-        return specialty_keyword_match
+            return _QUESTION_WORD_RE.search(query_lower) is not None
+
+        return False
     
-    def _is_appointment_query(self, query: str) -> bool:
+    def _is_appointment_query(self, query_lower: str) -> bool:
         """
         Determine if a query is related to appointments.
         
         Args:
-            query: The user query to check
+            query_lower: The user query, pre-lowercased by the caller
             
         Returns:
             Boolean indicating if the query is about appointments
         """
-        query_lower = query.lower()
-        
         # Direct appointment keywords that strongly indicate appointment intent
-        strong_appointment_indicators = [
-            "book appointment", "schedule appointment", "make appointment", 
-            "get appointment", "create appointment", "new appointment",
-            "appointment booking", "appointment schedule", "appointment availability",
-            "book a visit", "schedule a visit", "book a slot"
-        ]
-        
-        for indicator in strong_appointment_indicators:
-            if indicator in query_lower:
-                return True
-        
+        if _STRONG_APPOINTMENT_RE.search(query_lower):
+            return True
+
         # Check for appointment-related question patterns
-        appointment_patterns = [
-            r"(book|schedule|make|get|create).+(appointment|visit|consultation)",
-            r"(available|free|open).+(slot|time|appointment)",
-            r"(when|how).+(see|meet|visit).+(doctor|specialist)",
-            r"(my|check).+(appointment|booking|reservation)",
-            r"walk.?in",
-            r"follow.?up",
-            r"(today|tomorrow).+(appointment|visit)",
-            r"(appointment|booking).+(system|process|available)"
-        ]
-        
-        for pattern in appointment_patterns:
-            if re.search(pattern, query_lower):
-                return True
-                
+        if _APPOINTMENT_PATTERN_RE.search(query_lower):
+            return True
+
         # More general queries that mention both appointment-related terms
-        if any(word in query_lower for word in ["appointment", "booking", "schedule", "slot"]):
-            if any(word in query_lower for word in ["doctor", "hospital", "clinic", "medical", "visit"]):
-                return True
-                
+        if _APPOINTMENT_NOUN_RE.search(query_lower) and _APPOINTMENT_CONTEXT_RE.search(query_lower):
+            return True
+
         return False
     
-    def _select_appointment_tool(self, query: str) -> Dict[str, Any]:
+    def _select_appointment_tool(self, query_lower: str) -> Dict[str, Any]:
         """
         Select the appropriate appointment tool based on the query.
         
         Args:
-            query: The user query
+            query_lower: The user query, pre-lowercased by the caller
             
         Returns:
             Dictionary containing the action type and parameters
         """
-        query_lower = query.lower()
-        
         # Check for specific appointment actions
         if any(term in query_lower for term in ["today", "current", "ongoing", "active"]):
             if "appointment" in query_lower:
@@ -382,7 +662,7 @@ class ReActAgent:
             "parameters": {}
         }
     
-    def _act(self, action: Dict[str, Any]) -> Dict[str, Any]:
+    def _act(self, action: Dict[str, Any]) -> "ActionResult":
         """
         Execute the action determined by the reasoning step.
         
@@ -394,16 +674,12 @@ class ReActAgent:
         """
         logger.info("\n=== ACTION ===")
         logger.info(f"Executing action: {action['action_type']}")
-        logger.info(f"Parameters: {json.dumps(action.get('parameters', {}), indent=2)}")
+        logger.debug("Parameters: %s", _LazyJson(action.get("parameters", {})))
         
         # Check if the action type is valid
         if action["action_type"] not in self.tools:
             logger.error(f"Unknown action type: {action['action_type']}")
-            return {
-                "success": False,
-                "error": f"Unknown action type: {action['action_type']}",
-                "result": None
-            }
+            return ActionResult(False, error=f"Unknown action type: {action['action_type']}")
         
         # Execute the corresponding tool function
         try:
@@ -418,28 +694,37 @@ class ReActAgent:
             
             # Check if the result indicates missing parameters
             if isinstance(result, dict) and result.get("needs_parameters", False):
-                return {
-                    "success": False,
-                    "needs_parameters": True,
-                    "parameter_prompt": result.get("user_message", "Additional information required"),
-                    "tool_name": tool_name,
-                    "parameter_requirements": result,
-                    "result": None
-                }
+                return ActionResult(
+                    False,
+                    needs_parameters=True,
+                    parameter_prompt=result.get("user_message", "Additional information required"),
+                    tool_name=tool_name,
+                    parameter_requirements=result
+                )
             
-            return {
-                "success": True,
-                "result": result
-            }
+            return ActionResult(True, result)
         except Exception as e:
             logger.error(f"Error executing action: {str(e)}")
-            return {
-                "success": False,
-                "error": str(e),
-                "result": None
-            }
+            return ActionResult(False, error=str(e))
     
-    def _observe(self, action_result: Dict[str, Any]) -> Dict[str, Any]:
+    def _act_parallel(self, actions: List[Dict[str, Any]]) -> List["ActionResult"]:
+        """
+        Execute several independent actions concurrently.
+
+        Tools are I/O-bound HTTP calls, so fanning them out on the executor
+        costs one thread each instead of serializing the round trips.
+
+        Args:
+            actions: List of action dictionaries
+
+        Returns:
+            Action results in the same order as the input actions
+        """
+        if len(actions) == 1:
+            return [self._act(actions[0])]
+        return list(self._tool_executor.map(self._act, actions))
+
+    def _observe(self, action_result: "ActionResult") -> Dict[str, Any]:
         """
         Process the output of the executed action.
         
@@ -451,23 +736,58 @@ class ReActAgent:
         """
         logger.info("\n=== OBSERVATION ===")
         
-        if action_result["success"]:
-            observation = action_result["result"]
-            logger.info(f"Observation: {json.dumps(observation, indent=2)}")
+        if action_result.success:
+            observation = action_result.result
+            logger.debug("Observation: %s", _LazyJson(observation))
         else:
-            observation = f"Error: {action_result['error']}"
+            observation = f"Error: {action_result.error}"
             logger.info(f"Observation: {observation}")
         
         return {"observation": observation}
-    
-    def chat(self, user_query: str) -> str:
+
+    def _summarize_observation(self, action_result: "ActionResult") -> Optional[str]:
+        """
+        Render a tool result as a short human-readable string for insertion
+        into a response template.
+
+        Only genuinely presentable results get a summary: a specialty
+        list, or a non-error dict with a string message/status. Anything
+        else (error dicts from the tools' own exception handling, merged
+        multi-action lists, arbitrary payloads) returns None so the
+        caller falls back to the final LLM call instead of pasting a raw
+        repr into the user-facing answer.
+
+        Args:
+            action_result: Successful result from the action step
+
+        Returns:
+            Compact text summary of the tool's output, or None if the
+            result has no user-presentable form
+        """
+        result = action_result.result
+
+        if isinstance(result, dict) and "specialties" in result:
+            return _format_specialties(result["specialties"])
+
+        if isinstance(result, dict) and "error" not in result:
+            message = result.get("message") or result.get("status")
+            if isinstance(message, str) and message:
+                return message
+
+        return None
+
+    def chat(self, user_query: str, executed_tools: Optional[set] = None) -> str:
         """
         Main entry point for chat interaction.
         Implements the full ReAct loop: Reason -> Act -> Observe -> Final answer
-        
+
         Args:
             user_query: User's input query
-            
+            executed_tools: Optional set the agent fills with the
+                action_type of every tool this turn attempted, so callers
+                can tell side-effecting turns (see MUTATING_TOOLS) apart
+                from pure lookups before caching the answer
+
         Returns:
             Agent's response to the user (always a string)
         """
@@ -477,27 +797,93 @@ class ReActAgent:
         self.conversation_history.append({"role": "user", "content": user_query})
         
         try:
+            # Speculatively warm the specialty catalog while reasoning runs
+            # (same overlap as the streaming path). A fresh TTL cache makes
+            # this a no-op; on a miss the fetch proceeds concurrently and
+            # _act finds the catalog already hot. Failures are only logged —
+            # the tool call retries and reports real errors itself.
+            prefetch = self._tool_executor.submit(self.tools_manager._fetch_all_specialties)
+            prefetch.add_done_callback(_log_prefetch_failure)
+
             # REASON: Determine what to do based on the user query
             reasoning_output = self._reason(user_query)
             
             # HANDLE TOOL-USING QUERIES
             if reasoning_output.get("use_tool", False):
-                # ACT: Execute the action
-                action_result = self._act(reasoning_output["action"])
-                
+                # ACT: Execute the action(s). Multiple independent actions
+                # run concurrently; their results are merged into one
+                # observation for the final-answer step
+                actions = reasoning_output.get("actions")
+
+                # Record attempted tools before executing them: even an
+                # ambiguous failure may have committed upstream, so the
+                # caller must treat the attempt itself as the side effect
+                if executed_tools is not None:
+                    executed_tools.update(
+                        a.get("action_type", "")
+                        for a in (actions or [reasoning_output["action"]])
+                    )
+
+                if actions:
+                    reasoning_output.setdefault("action", actions[0])
+                    results = self._act_parallel(actions)
+                    needs = next((r for r in results if not r.success and r.needs_parameters), None)
+                    if needs:
+                        action_result = needs
+                    else:
+                        success = all(r.success for r in results)
+                        action_result = ActionResult(
+                            success,
+                            result=[r.result for r in results],
+                            error=None if success else "; ".join(
+                                str(r.error) for r in results if not r.success
+                            )
+                        )
+                else:
+                    action_result = self._act(reasoning_output["action"])
+
                 # Check if the action needs parameters
-                if not action_result["success"] and action_result.get("needs_parameters", False):
+                if not action_result.success and action_result.needs_parameters:
                     logger.info("\n=== PARAMETER REQUIREMENTS ===")
                     logger.info("Tool requires parameters from user")
-                    final_answer = action_result.get("parameter_prompt", "I need additional information to complete this request.")
+                    final_answer = action_result.parameter_prompt or "I need additional information to complete this request."
                     
                     # Add agent response to conversation history
                     self.conversation_history.append({"role": "assistant", "content": final_answer})
                     return final_answer
                 
+                # DIRECT FORMAT: a small specialty list needs no LLM
+                # summarization — a templated formatter restates it
+                # faithfully and skips the whole final round trip
+                result = action_result.result
+                if (action_result.success
+                        and reasoning_output.get("action", {}).get("action_type") == "get_doctor_specialties"
+                        and isinstance(result, dict) and "specialties" in result
+                        and (result.get("is_full_list")
+                             or len(result["specialties"]) <= _DIRECT_FORMAT_MAX)):
+                    logger.info("\n=== DIRECT FORMAT (no final LLM call) ===")
+                    limit = _FULL_LIST_LIMIT if result.get("is_full_list") else _DIRECT_FORMAT_MAX
+                    final_answer = _format_specialties(result["specialties"], limit=limit)
+                    self.conversation_history.append({"role": "assistant", "content": final_answer})
+                    return final_answer
+
                 # OBSERVE: Process the result of the action
                 observation = self._observe(action_result)
-                
+
+                # FUSED PATH: if the reasoning step already supplied a
+                # response template with a reserved observation slot and
+                # the result summarizes cleanly, fill it in and skip the
+                # second LLM round trip entirely; results without a
+                # presentable summary fall through to the final LLM call
+                template = reasoning_output.get("response_template")
+                if action_result.success and template and "{observation}" in template:
+                    summary = self._summarize_observation(action_result)
+                    if summary is not None:
+                        logger.info("\n=== FUSED ANSWER (no second LLM call) ===")
+                        final_answer = template.replace("{observation}", summary)
+                        self.conversation_history.append({"role": "assistant", "content": final_answer})
+                        return final_answer
+
                 # FINAL REASONING: Generate final answer based on the observation
                 final_prompt = self._construct_final_answer_prompt(
                     user_query, 
@@ -515,40 +901,16 @@ class ReActAgent:
                 except Exception as e:
                     logger.error(f"Error in final reasoning: {str(e)}")
                     # Fallback if LLM fails during final reasoning
-                    if action_result["success"]:
+                    if action_result.success:
                         tool_type = reasoning_output["action"]["action_type"]
                         
-                        if tool_type == "get_doctor_specialties" and "specialties" in action_result["result"]:
-                            specialties = action_result["result"]["specialties"]
-                            if specialties:
-                                specialty_names = [s.get("DESCRIPTION", "Unknown") for s in specialties[:5]]
-                                final_answer = f"I found these specialties: {', '.join(specialty_names)}"
-                                if len(specialties) > 5:
-                                    final_answer += f" and {len(specialties) - 5} more."
-                            else:
-                                final_answer = "I couldn't find any matching specialties for your query."
-                        # Handle appointment-related tools
-                        elif "create_walkin" in tool_type:
-                            final_answer = "I've scheduled a walk-in appointment for you. Your appointment has been confirmed."
-                        elif "get_today_appointments" in tool_type:
-                            final_answer = "I've retrieved today's appointments. You can view the details in the system."
-                        elif "get_ongoing_visits" in tool_type:
-                            final_answer = "I've checked the ongoing visits in the hospital. The information has been retrieved."
-                        elif "get_session_slots" in tool_type:
-                            final_answer = "I've found available appointment slots. You can select one for your appointment."
-                        elif "get_appointment_followup" in tool_type:
-                            final_answer = "I've checked your follow-up appointments. The information is now available."
-                        elif "get_patient_journey" in tool_type:
-                            final_answer = "I've retrieved your patient journey information. You can see your progress."
-                        elif "create_visit" in tool_type:
-                            final_answer = "I've created a visit record for your appointment. You're all set."
-                        elif "search_by_id_number" in tool_type:
-                            final_answer = "I've found your patient record using your ID number. Your information has been retrieved."
-                        elif "activate_sso" in tool_type:
-                            final_answer = "I've activated your SSO account. You can now log in with your credentials."
+                        if tool_type == "get_doctor_specialties" and "specialties" in action_result.result:
+                            final_answer = _format_specialties(action_result.result["specialties"])
                         else:
-                            # Generic response for other tools
-                            final_answer = f"I processed your request about {tool_type.replace('_', ' ')}. The operation was successful."
+                            final_answer = _FALLBACK_MESSAGES.get(
+                                tool_type,
+                                f"I processed your request about {tool_type.replace('_', ' ')}. The operation was successful."
+                            )
                     else:
                         final_answer = "I'm sorry, I encountered an error while processing your request."
             
@@ -582,6 +944,170 @@ class ReActAgent:
             self.conversation_history.append({"role": "assistant", "content": error_message})
             return error_message
     
+    def _get_async_client(self) -> httpx.AsyncClient:
+        """
+        Lazily create the shared async HTTP client used for streaming.
+        """
+        if self._async_client is None:
+            self._async_client = httpx.AsyncClient(timeout=60)
+        return self._async_client
+
+    def close(self) -> None:
+        """
+        Release the pooled HTTP connections held by the shared session.
+        """
+        self.session.close()
+
+    async def _stream_llm(self, messages: List[Dict[str, str]]) -> AsyncIterator[str]:
+        """
+        Call the LLM with streaming enabled and yield content deltas as
+        they arrive, parsing the OpenAI-compatible SSE frames.
+
+        Args:
+            messages: List of message dictionaries for the LLM
+
+        Yields:
+            Content chunks from the LLM response
+        """
+        payload = {
+            "model": "local-model",
+            "messages": messages,
+            "temperature": 0.7,
+            "max_tokens": 800,
+            "stream": True
+        }
+
+        client = self._get_async_client()
+        async with client.stream("POST", self.llm_endpoint, json=payload) as response:
+            response.raise_for_status()
+            async for line in response.aiter_lines():
+                if not line.startswith("data: "):
+                    continue
+                data = line[6:]
+                if data.strip() == "[DONE]":
+                    break
+                try:
+                    chunk = orjson.loads(data)
+                except orjson.JSONDecodeError:
+                    continue
+                delta = chunk.get("choices", [{}])[0].get("delta", {}).get("content")
+                if delta:
+                    yield delta
+
+    async def achat_stream(self, user_query: str) -> AsyncIterator[str]:
+        """
+        Streaming variant of chat: yields the final answer in chunks so the
+        caller can forward tokens as they arrive instead of waiting for the
+        full generation.
+
+        Heuristic/direct-answer branches yield their answer in one chunk;
+        only the final-answer LLM call is streamed.
+
+        Args:
+            user_query: User's input query
+
+        Yields:
+            Chunks of the agent's response
+        """
+        logger.info(f"\n\nUser Query (stream): {user_query}")
+        self.conversation_history.append({"role": "user", "content": user_query})
+
+        try:
+            # Warm the specialty catalog while reasoning runs: the fetch is
+            # independent of the reasoning result and TTL-cached, so when
+            # reasoning picks the specialty tool the catalog is already hot
+            # and when it doesn't, the warm cache serves the next turn.
+            # shield keeps a cancelled generator from poisoning the cache.
+            prefetch = asyncio.shield(
+                asyncio.to_thread(self.tools_manager._fetch_all_specialties)
+            )
+            reasoning_output, prefetch_result = await asyncio.gather(
+                asyncio.to_thread(self._reason, user_query),
+                prefetch,
+                return_exceptions=True
+            )
+            if isinstance(reasoning_output, BaseException):
+                raise reasoning_output
+            if isinstance(prefetch_result, BaseException):
+                # Not fatal: the tool call itself will retry the fetch and
+                # surface any real API error through the normal path
+                logger.debug(f"Specialty prefetch failed: {prefetch_result}")
+
+            if reasoning_output.get("use_tool", False):
+                # Mirror chat(): the reasoning prompt may answer with an
+                # "actions" list instead of a single "action"; run those
+                # concurrently and merge into one observation
+                actions = reasoning_output.get("actions")
+                if actions:
+                    reasoning_output.setdefault("action", actions[0])
+                    results = await asyncio.to_thread(self._act_parallel, actions)
+                    needs = next((r for r in results if not r.success and r.needs_parameters), None)
+                    if needs:
+                        action_result = needs
+                    else:
+                        success = all(r.success for r in results)
+                        action_result = ActionResult(
+                            success,
+                            result=[r.result for r in results],
+                            error=None if success else "; ".join(
+                                str(r.error) for r in results if not r.success
+                            )
+                        )
+                else:
+                    action_result = await asyncio.to_thread(self._act, reasoning_output["action"])
+
+                if not action_result.success and action_result.needs_parameters:
+                    answer = action_result.parameter_prompt or "I need additional information to complete this request."
+                    self.conversation_history.append({"role": "assistant", "content": answer})
+                    yield answer
+                    return
+
+                # Same deterministic short-circuit as chat(): small
+                # specialty lists don't need an LLM to restate them
+                result = action_result.result
+                if (action_result.success
+                        and reasoning_output.get("action", {}).get("action_type") == "get_doctor_specialties"
+                        and isinstance(result, dict) and "specialties" in result
+                        and (result.get("is_full_list")
+                             or len(result["specialties"]) <= _DIRECT_FORMAT_MAX)):
+                    limit = _FULL_LIST_LIMIT if result.get("is_full_list") else _DIRECT_FORMAT_MAX
+                    answer = _format_specialties(result["specialties"], limit=limit)
+                    self.conversation_history.append({"role": "assistant", "content": answer})
+                    yield answer
+                    return
+
+                observation = self._observe(action_result)
+                final_prompt = self._construct_final_answer_prompt(
+                    user_query,
+                    reasoning_output,
+                    action_result,
+                    observation
+                )
+
+                parts = []
+                async for delta in self._stream_llm(final_prompt):
+                    parts.append(delta)
+                    yield delta
+
+                self.conversation_history.append({"role": "assistant", "content": "".join(parts)})
+                return
+
+            if "direct_answer" in reasoning_output and reasoning_output["direct_answer"]:
+                answer = reasoning_output["direct_answer"]
+            elif reasoning_output.get("out_of_scope", False):
+                answer = "I'm currently focused on providing information about doctor specialties and appointments at our hospital. I don't have information about other topics yet. How can I help you with our medical specialists or scheduling appointments?"
+            else:
+                answer = "I'm here to help with questions about doctor specialties and appointments at our hospital. How can I assist you today?"
+
+            self.conversation_history.append({"role": "assistant", "content": answer})
+            yield answer
+
+        except Exception as e:
+            logger.error(f"Unexpected error in streaming chat flow: {str(e)}")
+            error_message = "I'm sorry, I encountered an unexpected error. Please try asking about our doctor specialties or appointments again."
+            self.conversation_history.append({"role": "assistant", "content": error_message})
+            yield error_message
+
     def _construct_reasoning_prompt(self, user_query: str) -> List[Dict[str, str]]:
         """
         Constructs the prompt for the reasoning step.
@@ -592,90 +1118,14 @@ class ReActAgent:
         Returns:
             Formatted prompt for the LLM
         """
-        system_message = """
-        You are an intelligent hospital assistant that helps users with their queries about doctor specialties and appointments only.
-        
-        Your task is to analyze the user's query and decide whether to use a tool or answer directly.
-        
-        Currently, you have access to the following tools:
-        
-        SPECIALTY TOOLS:
-        1. get_doctor_specialties: Retrieves information about doctor specialties
-        
-        APPOINTMENT TOOLS:
-        2. activate_sso: Activates Single Sign-On for a user
-        3. search_by_id_number: Searches for a patient by ID number
-        4. get_today_appointments: Retrieves today's appointments
-        5. get_ongoing_visits: Retrieves ongoing patient visits
-        6. init_appointments: Initializes the appointments system
-        7. get_user_dataset: Retrieves user dataset for appointments
-        8. get_session_slots: Retrieves appointment session slots
-        9. create_walkin: Creates a walk-in appointment
-        10. get_appointment_number: Retrieves appointment numbers
-        11. create_visit: Creates a patient visit
-        12. get_patient_journey: Retrieves patient journey information
-        13. get_appointment_followup: Retrieves follow-up appointment information
-        
-        IMPORTANT: You should ONLY answer questions about doctor specialties and appointments in the hospital. For ANY other topic:
-        1. You must set "out_of_scope" to true
-        2. You should NOT provide an answer, as you don't have verified information on other topics
-        3. Your response should direct the user back to asking about doctor specialties or appointments
-        
-        EXAMPLES OF SPECIALTY QUERIES:
-        - "What specialties do you have?"
-        - "Do you have cardiologists?"
-        - "Tell me about your orthopedic department"
-        
-        EXAMPLES OF APPOINTMENT QUERIES:
-        - "I want to book an appointment"
-        - "Show me today's appointments"
-        - "What appointment slots are available?"
-        - "How do I schedule a follow-up?"
-        
-        EXAMPLES OF OUT-OF-SCOPE QUERIES:
-        - "What medications should I take for headaches?"
-        - "How much does surgery cost?"
-        - "What's the weather today?"
-        
-        For each query, you should:
-        1. Think about what the user is asking for
-        2. Decide if it's about doctor specialties or appointments (if not, mark it out of scope)
-        3. Format your response as JSON with the following structure:
-        
-        If you need to use a tool:
-        {
-            "reasoning": "your step-by-step reasoning",
-            "use_tool": true,
-            "action": {
-                "action_type": "[one of the tool names]",
-                "parameters": {"param1": "value1", "param2": "value2"}
-            }
-        }
-        
-        If you can answer directly (ONLY for basic specialty/appointment information or greetings):
-        {
-            "reasoning": "your step-by-step reasoning",
-            "use_tool": false,
-            "direct_answer": "your answer to the user's query about doctor specialties or appointments"
-        }
-        
-        If the query is NOT about doctor specialties or appointments:
-        {
-            "reasoning": "your step-by-step reasoning",
-            "use_tool": false,
-            "out_of_scope": true,
-            "direct_answer": null
-        }
-        """
-        
-        messages = [
-            {"role": "system", "content": system_message},
-        ]
-        
-        # Add conversation history (limited to last few exchanges for context)
-        for message in self.conversation_history[-4:]:
-            messages.append(message)
-            
+        messages = [_REASONING_SYSTEM_MSG]
+
+        # Add conversation history (limited to last few exchanges for
+        # context); islice walks the deque tail without copying it
+        history = self.conversation_history
+        messages.extend(islice(history, max(0, len(history) - 4), None))
+
+
         # Add the current query
         messages.append({"role": "user", "content": f"User query: {user_query}\n\nRespond with the JSON format described in the instructions."})
         
@@ -695,42 +1145,16 @@ class ReActAgent:
         Returns:
             Formatted prompt for the LLM
         """
-        system_message = """
-        You are an intelligent hospital assistant that helps users with their queries about doctor specialties and appointments.
-        
-        Based on the user's query, the reasoning, and the observation from using a tool,
-        formulate a helpful, concise, and informative response.
-        
-        IMPORTANT RULES:
-        1. Only respond with information that is directly supported by the observation
-        2. If the observation doesn't provide enough information to answer, say so clearly
-        3. Never make up or hallucinate information about specialists, departments, or appointments
-        4. If relevant information is found, present it in a clear, helpful way
-        5. If no relevant information is found, politely inform the user
-        
-        Provide only the final answer without mentioning the reasoning process or the fact that you used a tool.
-        """
-        
-        prompt_content = f"""
-        User query: {user_query}
-        
-        Reasoning: {reasoning.get('reasoning', 'No reasoning provided')}
-        
-        Tool used: {reasoning.get('action', {}).get('action_type', 'No tool used')}
-        Tool parameters: {json.dumps(reasoning.get('action', {}).get('parameters', {}), indent=2)}
-        
-        Observation: {json.dumps(observation.get('observation', 'No observation available'), indent=2)}
-        
-        Based on this information, provide a helpful answer to the user's original query.
-        Remember to ONLY use information from the observation and do not make up or hallucinate any details.
-        """
-        
-        messages = [
-            {"role": "system", "content": system_message},
-            {"role": "user", "content": prompt_content}
-        ]
-        
-        return messages
+        action = reasoning.get('action', {})
+        prompt_content = _FINAL_PROMPT_TMPL.substitute(
+            user_query=user_query,
+            reasoning=reasoning.get('reasoning', 'No reasoning provided'),
+            tool=action.get('action_type', 'No tool used'),
+            params=orjson.dumps(action.get('parameters', {})).decode(),
+            observation=orjson.dumps(observation.get('observation', 'No observation available')).decode()
+        )
+
+        return [_FINAL_SYSTEM_MSG, {"role": "user", "content": prompt_content}]
     
     def _call_llm(self, messages: List[Dict[str, str]]) -> Dict[str, Any]:
         """
@@ -742,10 +1166,6 @@ class ReActAgent:
         Returns:
             LLM response
         """
-        headers = {
-            "Content-Type": "application/json"
-        }
-        
         payload = {
             "model": "local-model", # This can be adjusted based on the LLM's requirements
             "messages": messages,
@@ -754,13 +1174,15 @@ class ReActAgent:
         }
         
         try:
-            response = requests.post(
+            # orjson both ways: encode the payload ourselves (requests'
+            # json= uses stdlib json) and decode straight from the raw bytes
+            response = self.session.post(
                 self.llm_endpoint,
-                headers=headers,
-                json=payload
+                data=orjson.dumps(payload),
+                timeout=(3.05, self.llm_timeout)
             )
             response.raise_for_status()
-            return response.json()
+            return orjson.loads(response.content)
         except Exception as e:
             logger.error(f"Error calling LLM: {str(e)}")
             raise Exception(f"LLM call failed: {str(e)}")
@@ -778,15 +1200,13 @@ class ReActAgent:
         try:
             # Extract the content from the LLM response
             content = llm_response.get("choices", [{}])[0].get("message", {}).get("content", "{}")
-            
-            # Find JSON in the content (in case the LLM added extra text)
-            import re
-            json_match = re.search(r'\{.*\}', content, re.DOTALL)
-            if json_match:
-                content = json_match.group(0)
-            
-            # Parse the JSON response
-            parsed_response = json.loads(content)
+
+            # Parse directly first; fall back to slicing out the JSON object
+            # if the LLM wrapped it in extra text
+            try:
+                parsed_response = orjson.loads(content)
+            except orjson.JSONDecodeError:
+                parsed_response = orjson.loads(_extract_json_object(content))
             
             # Ensure required fields are present
             if "reasoning" not in parsed_response:
@@ -1,7 +1,12 @@
 import json
+import orjson
 import requests
+from requests.adapters import HTTPAdapter
 import os
+import re
+import time
 import logging
+import threading
 from typing import Dict, Any, Optional, List
 from datetime import datetime
 
@@ -9,6 +14,48 @@ from datetime import datetime
 logging.basicConfig(level=logging.INFO, format='%(message)s')
 logger = logging.getLogger("Tools")
 
+# (connect, read) timeout applied to every API call so a dead upstream
+# fails fast instead of hanging the worker thread indefinitely
+_REQUEST_TIMEOUT = (3.05, 30)
+
+# Endpoints that create or change records despite being issued as GETs
+# (the upstream API uses GET for these writes). GET is in urllib3's
+# default retry set, so the shared session's transient-error retry could
+# replay a booking that already committed upstream; these prefixes get a
+# no-retry adapter instead.
+_MUTATING_URL_PREFIXES = (
+    "http://eserver/api/his/AppointmentsAPI/CreateWalkin",
+    "http://eserver/api/his/AppointmentsAPI/CreateVisit",
+    "http://eserver/api/visitmgmt/Accounts/ActivateSSO",
+)
+
+# Term sets for specialty-query classification, hoisted so they are built
+# once and membership tests hash instead of scanning a list. The general
+# terms stay a tuple because they are matched as substrings of the query,
+# not as whole tokens.
+_FULL_LIST_TERMS = frozenset({"FULL", "ALL", "COMPLETE", "YES", "YEAH", "SURE", "LIST", "SHOW", "MORE"})
+_GENERAL_QUERY_TERMS = ("AVAILABLE", "LIST", "ALL", "WHAT", "WHICH", "HAVE", "OFFER")
+_STOP_WORDS = frozenset({
+    "WHAT", "WHICH", "ARE", "IS", "THE", "DO", "DOES", "YOU", "HAVE", "AVAILABLE",
+    "THERE", "ANY", "FOR", "A", "AN", "IN", "AT", "BY", "WITH", "ABOUT", "PLEASE",
+    "CAN", "COULD", "WOULD"
+})
+
+
+class _LazyJson:
+    """
+    Defers JSON pretty-printing until a log record is actually formatted,
+    so disabled log levels never pay the encoding cost.
+    """
+
+    __slots__ = ("_obj",)
+
+    def __init__(self, obj: Any):
+        self._obj = obj
+
+    def __str__(self) -> str:
+        return json.dumps(self._obj, indent=2)
+
 class Tools:
     """
     Tools for hospital chatbot using various APIs.
@@ -18,7 +65,8 @@ class Tools:
     def __init__(self, 
                  specialty_api_endpoint: str = "http://eserver/api/his/AppointmentsAPI/InitAll",
                  specialty_api_token: Optional[str] = None,
-                 debug_mode: bool = True):
+                 debug_mode: bool = True,
+                 session: Optional[requests.Session] = None):
         """
         Initialize the Tools.
         
@@ -26,19 +74,90 @@ class Tools:
             specialty_api_endpoint: Endpoint for the doctor specialty API
             specialty_api_token: Bearer token for API authentication
             debug_mode: Whether to show detailed debugging information
+            session: Shared requests.Session with connection pooling.
+                     If None, a private session is created.
         """
         self.specialty_api_endpoint = specialty_api_endpoint
         self.specialty_api_token = specialty_api_token or os.getenv("SPECIALTY_API_TOKEN")
         self.debug_mode = debug_mode
-        
-        # Default headers with token
+        self.session = session or requests.Session()
+
+        # requests picks the adapter with the longest matching URL prefix,
+        # so mounting these leaves the retrying adapter in place for every
+        # read-only endpoint while the write-via-GET ones fail straight
+        # through to the caller instead of being replayed
+        no_retry_adapter = HTTPAdapter(pool_connections=2, pool_maxsize=8, max_retries=0)
+        for prefix in _MUTATING_URL_PREFIXES:
+            self.session.mount(prefix, no_retry_adapter)
+
+        # TTL cache for the specialty catalog: it changes rarely, but every
+        # specialty query used to re-fetch it over HTTP. The lock collapses
+        # concurrent misses into a single upstream request.
+        self._specialty_cache: Optional[List[Dict[str, Any]]] = None
+        # Parallel (DESCRIPTION.upper(), record) pairs so the filter path
+        # never re-uppercases descriptions per query
+        self._specialty_index: List[tuple] = []
+        self._specialty_cache_expires = 0.0
+        self._specialty_cache_ttl = float(os.getenv("SPECIALTY_CACHE_TTL", "300"))
+        self._specialty_cache_lock = threading.Lock()
+
+        # Default headers with token, built once so no per-call dict or
+        # f-string work is needed on the request path
+        if not self.specialty_api_token:
+            logger.warning("No specialty API token configured; API calls will fail authorization")
         self.headers = {
             "accept": "*/*",
             "authorization": f"Bearer {self.specialty_api_token}"
         }
         
+        # debug_mode controls the logger level; debug-only payload dumps
+        # use lazy %-style args so they cost nothing when filtered out
+        logger.setLevel(logging.DEBUG if debug_mode else logging.INFO)
+
         logger.info("Tools initialized with debug_mode=%s", debug_mode)
-    
+
+    def _fetch_all_specialties(self) -> List[Dict[str, Any]]:
+        """
+        Fetch the full specialty catalog, serving it from the TTL cache
+        when fresh.
+
+        Returns:
+            List of specialty records from the API.
+        """
+        now = time.monotonic()
+        if self._specialty_cache is not None and now < self._specialty_cache_expires:
+            return self._specialty_cache
+
+        with self._specialty_cache_lock:
+            # Re-check under the lock: another thread may have refreshed
+            # the cache while we waited
+            now = time.monotonic()
+            if self._specialty_cache is not None and now < self._specialty_cache_expires:
+                return self._specialty_cache
+
+            logger.info(f"Making API request to {self.specialty_api_endpoint}")
+            response = self.session.get(
+                self.specialty_api_endpoint,
+                headers=self.headers,
+                timeout=_REQUEST_TIMEOUT
+            )
+            response.raise_for_status()
+            data = orjson.loads(response.content)
+
+            # Log the raw bytes, bounded before formatting: no JSON
+            # re-encode and nothing beyond 500 bytes ever touches a string
+            logger.debug("Raw API response (first 500 bytes): %s", response.content[:500])
+
+            all_specialties = data.get("Codes", {}).get("SPECIALITY", [])
+            logger.info(f"Retrieved {len(all_specialties)} specialties from API")
+
+            self._specialty_cache = all_specialties
+            self._specialty_index = [
+                (s.get("DESCRIPTION", "").upper(), s) for s in all_specialties
+            ]
+            self._specialty_cache_expires = now + self._specialty_cache_ttl
+            return all_specialties
+
     def get_doctor_specialties(self, parameters: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
         """
         Get doctor specialties from the API.
@@ -54,31 +173,18 @@ class Tools:
             parameters = {"query": "all available specialties"}
 
         try:
-            logger.info(f"Making API request to {self.specialty_api_endpoint}")
-            response = requests.get(
-                self.specialty_api_endpoint,
-                headers=self.headers
-            )
-            response.raise_for_status()
-
-            # For demonstration/debug, log the raw response
-            if self.debug_mode:
-                logger.info(f"Raw API response: {json.dumps(response.json(), indent=2)[:500]}...")
-
-            # Get all specialties from the response
-            all_specialties = response.json().get("Codes", {}).get("SPECIALITY", [])
-            logger.info(f"Retrieved {len(all_specialties)} specialties from API")
+            # Get all specialties (cached with a TTL; see _fetch_all_specialties)
+            all_specialties = self._fetch_all_specialties()
 
             # If a query parameter is provided, filter the results
             query = parameters.get("query", "").upper()
+            query_tokens = query.split()
 
             # Check if this is a request for the full list
-            full_list_terms = ["FULL", "ALL", "COMPLETE", "YES", "YEAH", "SURE", "LIST", "SHOW", "MORE"]
-            is_full_list_request = any(term in query.split() for term in full_list_terms)
+            is_full_list_request = not _FULL_LIST_TERMS.isdisjoint(query_tokens)
 
             # Check if this is a general query about available specialties
-            general_query_terms = ["AVAILABLE", "LIST", "ALL", "WHAT", "WHICH", "HAVE", "OFFER"]
-            is_general_query = any(term in query for term in general_query_terms)
+            is_general_query = any(term in query for term in _GENERAL_QUERY_TERMS)
 
             # For full list requests or general queries, return all specialties
             if is_full_list_request or is_general_query:
@@ -87,23 +193,25 @@ class Tools:
 
             # For specific specialty queries
             if query:
-                # Extract query terms for more flexible matching
-                query_terms = query.split()
-
                 # Filter out common words that aren't helpful for matching
-                stop_words = ["WHAT", "WHICH", "ARE", "IS", "THE", "DO", "DOES", "YOU", "HAVE", "AVAILABLE", "THERE", "ANY", "FOR", "A", "AN", "IN", "AT", "BY", "WITH", "ABOUT", "PLEASE", "CAN", "COULD", "WOULD"]
-                query_terms = [term for term in query_terms if term not in stop_words]
+                query_terms = [term for term in query_tokens if term not in _STOP_WORDS]
 
                 logger.info(f"Filtering specialties by query terms: {query_terms}")
-                filtered_specialties = []
-
-                # Check each specialty against each query term
-                for specialty in all_specialties:
-                    desc = specialty.get("DESCRIPTION", "").upper()
 
-                    # Match if any term is contained in the description
-                    if any(term in desc for term in query_terms):
-                        filtered_specialties.append(specialty)
+                # One alternation compiled per query, then a single C-level
+                # scan of each precomputed uppercase description instead of
+                # a Python loop of substring checks per term. An empty term
+                # list matches nothing, as before — an empty alternation
+                # would match everything
+                if query_terms:
+                    term_re = re.compile("|".join(re.escape(term) for term in query_terms))
+                    filtered_specialties = [
+                        specialty
+                        for desc, specialty in self._specialty_index
+                        if term_re.search(desc)
+                    ]
+                else:
+                    filtered_specialties = []
 
                 logger.info(f"Found {len(filtered_specialties)} matching specialties")
                 return {"specialties": filtered_specialties}
@@ -130,8 +238,8 @@ class Tools:
         """
         try:
             url = "http://eserver/api/visitmgmt/Accounts/ActivateSSO?Id=$2a$06$209Th1Z/ZBraqhPa2PIQDeM/7T65Y6Y6MRS6YjefwVomvFAuMwYtG"
-            res = requests.get(url, headers={"accept": "*/*"})
-            return res.json()
+            res = self.session.get(url, headers={"accept": "*/*"}, timeout=_REQUEST_TIMEOUT)
+            return orjson.loads(res.content)
         except Exception as e:
             logger.error(f"Error activating SSO: {str(e)}")
             return {"error": str(e)}
@@ -156,8 +264,8 @@ class Tools:
         try:
             id_number = parameters.get("id_number", "DD15021998")
             url = f"http://eserver/api/clinicaldocs/Codes/SearchText?CodeName=CHECKIDNO&text={id_number}"
-            res = requests.get(url, headers=self.headers)
-            return res.json()
+            res = self.session.get(url, headers=self.headers, timeout=_REQUEST_TIMEOUT)
+            return orjson.loads(res.content)
         except Exception as e:
             logger.error(f"Error searching by ID number: {str(e)}")
             return {"error": str(e)}
@@ -174,8 +282,8 @@ class Tools:
         """
         try:
             url = "http://eserver/api/clinicaldocs/VisitDocs/GetRecordset?VisitId=3598&QueryName=GET_TODAYAPPTS"
-            res = requests.get(url, headers=self.headers)
-            return res.json()
+            res = self.session.get(url, headers=self.headers, timeout=_REQUEST_TIMEOUT)
+            return orjson.loads(res.content)
         except Exception as e:
             logger.error(f"Error getting today's appointments: {str(e)}")
             return {"error": str(e)}
@@ -192,8 +300,8 @@ class Tools:
         """
         try:
             url = "http://eserver/api/clinicaldocs/VisitDocs/GetRecordset?VisitId=3598&QueryName=GET_ONGOINGVISITS"
-            res = requests.get(url, headers=self.headers)
-            return res.json()
+            res = self.session.get(url, headers=self.headers, timeout=_REQUEST_TIMEOUT)
+            return orjson.loads(res.content)
         except Exception as e:
             logger.error(f"Error getting ongoing visits: {str(e)}")
             return {"error": str(e)}
@@ -210,8 +318,8 @@ class Tools:
         """
         try:
             url = "http://eserver/api/his/AppointmentsAPI/InitAll"
-            res = requests.get(url, headers=self.headers)
-            return res.json()
+            res = self.session.get(url, headers=self.headers, timeout=_REQUEST_TIMEOUT)
+            return orjson.loads(res.content)
         except Exception as e:
             logger.error(f"Error initializing appointments: {str(e)}")
             return {"error": str(e)}
@@ -266,8 +374,8 @@ class Tools:
             url = "http://eserver/api/his/AppointmentsAPI/GetUserDataset?QueryName=APPOINTMENTFINDRESC"
             headers = {**self.headers, "content-type": "application/json"}
             
-            res = requests.post(url, headers=headers, json=body)
-            return res.json()
+            res = self.session.post(url, headers=headers, json=body, timeout=_REQUEST_TIMEOUT)
+            return orjson.loads(res.content)
         except Exception as e:
             logger.error(f"Error getting user dataset: {str(e)}")
             return {"error": str(e)}
@@ -312,8 +420,8 @@ class Tools:
             session_id = parameters.get("session_id", "363")
             
             url = f"http://eserver/api/his/AppointmentsAPI/GetSessionSlots?Id={resource_id}&SessionDate={session_date}T00%3A00%3A00.000Z&SessionId={session_id}"
-            res = requests.get(url, headers=self.headers)
-            return res.json()
+            res = self.session.get(url, headers=self.headers, timeout=_REQUEST_TIMEOUT)
+            return orjson.loads(res.content)
         except Exception as e:
             logger.error(f"Error getting session slots: {str(e)}")
             return {"error": str(e)}
@@ -368,8 +476,8 @@ class Tools:
             patient_id = parameters.get("patient_id", "3598")
             
             url = f"http://eserver/api/his/AppointmentsAPI/CreateWalkin?ResourceId={resource_id}&SessionId={session_id}&SessionDate={session_date}&FromTime={from_time}&PatientId={patient_id}"
-            res = requests.get(url, headers=self.headers)
-            return res.json()
+            res = self.session.get(url, headers=self.headers, timeout=_REQUEST_TIMEOUT)
+            return orjson.loads(res.content)
         except Exception as e:
             logger.error(f"Error creating walk-in: {str(e)}")
             return {"error": str(e)}
@@ -386,8 +494,8 @@ class Tools:
         """
         try:
             url = "http://eserver/api/his/AppointmentsAPI/GetAppointmentNumber"
-            res = requests.get(url, headers=self.headers)
-            return res.json()
+            res = self.session.get(url, headers=self.headers, timeout=_REQUEST_TIMEOUT)
+            return orjson.loads(res.content)
         except Exception as e:
             logger.error(f"Error getting appointment number: {str(e)}")
             return {"error": str(e)}
@@ -412,8 +520,8 @@ class Tools:
         try:
             appointment_id = parameters.get("appointment_id", "1820")
             url = f"http://eserver/api/his/AppointmentsAPI/CreateVisit?AppointmentId={appointment_id}"
-            res = requests.get(url, headers=self.headers)
-            return res.json()
+            res = self.session.get(url, headers=self.headers, timeout=_REQUEST_TIMEOUT)
+            return orjson.loads(res.content)
         except Exception as e:
             logger.error(f"Error creating visit: {str(e)}")
             return {"error": str(e)}
@@ -438,8 +546,8 @@ class Tools:
         try:
             visit_id = parameters.get("visit_id", "3502")
             url = f"http://eserver/api/clinicaldocs/VisitDocs/GetPatientJourney?VisitId={visit_id}"
-            res = requests.get(url, headers=self.headers)
-            return res.json()
+            res = self.session.get(url, headers=self.headers, timeout=_REQUEST_TIMEOUT)
+            return orjson.loads(res.content)
         except Exception as e:
             logger.error(f"Error getting patient journey: {str(e)}")
             return {"error": str(e)}
@@ -475,8 +583,8 @@ class Tools:
             date_to = parameters.get("date_to")
             
             url = f"http://eserver/api/clinicaldocs/VisitDocs/GetRecordset?VisitId={patient_id}&QueryName=GET_FOLLOWUP&ParamDateFrom={date_from}&ParamDateTo={date_to}"
-            res = requests.get(url, headers=self.headers)
-            return res.json()
+            res = self.session.get(url, headers=self.headers, timeout=_REQUEST_TIMEOUT)
+            return orjson.loads(res.content)
         except Exception as e:
             logger.error(f"Error getting appointment followup: {str(e)}")
             return {"error": str(e)}